@@ -18,11 +18,95 @@ To use these patterns:
 DO NOT run this file directly - it's for reference only.
 """
 
-import os
+import asyncio
+import base64
+import heapq
 import json
 import logging
-from typing import Dict, Optional
-from urllib.parse import urlparse
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Callable, Collection, Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+@lru_cache(maxsize=1024)
+def _hostname(url: str) -> Optional[str]:
+    """
+    Extract the hostname from a URL, memoized across requests.
+
+    The same URLs recur constantly (polling, retries, cache lookups), so this
+    skips the parse entirely on a hit. Check _hostname.cache_info() to tune maxsize.
+    """
+    return urlsplit(url).hostname
+
+
+class DomainPolicy:
+    """
+    Every per-domain setting for one hostname, merged from the DOMAIN_* tables.
+
+    Fields a domain doesn't configure are None. Look the policy up once per
+    request with lookup_policy(hostname) and pass it to each helper.
+    """
+
+    _FIELDS = (
+        "auth_header",
+        "timeout",
+        "verify_ssl",
+        "custom_headers",
+        "rate_limit",
+        "cache_ttl",
+        "transform",
+    )
+
+    __slots__ = ("hostname",) + _FIELDS
+
+    def __init__(
+        self,
+        hostname: str,
+        auth_header: Optional[tuple[str, str]] = None,
+        timeout: Optional[float] = None,
+        verify_ssl: Optional[bool] = None,
+        custom_headers: Optional[Dict[str, str]] = None,
+        rate_limit: Optional[Dict[str, int]] = None,
+        cache_ttl: Optional[float] = None,
+        transform: Optional[Callable[[Any, str], Any]] = None,
+    ):
+        self.hostname = hostname
+        self.auth_header = auth_header
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+        self.custom_headers = custom_headers
+        self.rate_limit = rate_limit
+        self.cache_ttl = cache_ttl
+        self.transform = transform
+
+
+@lru_cache(maxsize=1024)
+def lookup_policy(hostname: Optional[str]) -> Optional[DomainPolicy]:
+    """
+    Get the DomainPolicy for a hostname, or None if it has no config.
+
+    Config keys match exactly, and "*.example.com" keys match any subdomain of
+    example.com. When several keys match, the most specific setting wins for
+    each field.
+
+    Both answers are memoized, so the many ad-hoc hostnames with no config
+    cost a single cache hit after their first request. Call
+    reload_domain_policies() after changing the config tables.
+    """
+    if not hostname:
+        return None
+    return _match_policy(hostname)
+
+
+def _policy_for_url(url: str) -> Optional[DomainPolicy]:
+    """Look up the DomainPolicy for a URL's hostname, or None if it has no config"""
+    return lookup_policy(_hostname(url))
 
 
 # ============================================================================
@@ -52,47 +136,59 @@ DOMAIN_AUTH_CONFIG = {
 }
 
 
-def inject_authentication(url: str, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+def _build_auth_header(auth_config: Dict[str, str]) -> Optional[tuple[str, str]]:
+    """Build the (header_name, header_value) pair for an auth entry, or None if credentials are missing"""
+    if auth_config["type"] == "bearer":
+        token = auth_config["token"]
+        if token:
+            return "Authorization", f"Bearer {token}"
+
+    elif auth_config["type"] == "basic":
+        username = auth_config["username"]
+        password = auth_config["password"]
+        if username and password:
+            credentials = f"{username}:{password}"
+            encoded = base64.b64encode(credentials.encode()).decode()
+            return "Authorization", f"Basic {encoded}"
+
+    elif auth_config["type"] == "header":
+        header_value = auth_config["header_value"]
+        if header_value:
+            return auth_config["header_name"], header_value
+
+    return None
+
+
+def inject_authentication(
+    policy: Optional[DomainPolicy], headers: Optional[Dict[str, str]]
+) -> Dict[str, str]:
     """
     Automatically inject authentication headers based on domain.
 
+    Credentials don't change between requests, so the header value is built
+    once into the domain's policy when DOMAIN_POLICY is created.
+
     Usage:
         In make_http_request(), before calling httpx:
-        headers = inject_authentication(request.url, request.headers)
+        headers = inject_authentication(policy, request.headers)
     """
     headers = headers or {}
-    parsed = urlparse(url)
-    hostname = parsed.hostname
-
-    if hostname in DOMAIN_AUTH_CONFIG:
-        auth_config = DOMAIN_AUTH_CONFIG[hostname]
-
-        if auth_config["type"] == "bearer":
-            token = auth_config["token"]
-            if token:
-                headers["Authorization"] = f"Bearer {token}"
-                logging.info(f"Injected Bearer token for {hostname}")
-
-        elif auth_config["type"] == "basic":
-            import base64
-            username = auth_config["username"]
-            password = auth_config["password"]
-            if username and password:
-                credentials = f"{username}:{password}"
-                encoded = base64.b64encode(credentials.encode()).decode()
-                headers["Authorization"] = f"Basic {encoded}"
-                logging.info(f"Injected Basic auth for {hostname}")
-
-        elif auth_config["type"] == "header":
-            header_name = auth_config["header_name"]
-            header_value = auth_config["header_value"]
-            if header_value:
-                headers[header_name] = header_value
-                logging.info(f"Injected custom header {header_name} for {hostname}")
+
+    if policy is None or policy.auth_header is None:
+        return headers
+
+    header_name, header_value = policy.auth_header
+    headers[header_name] = header_value
+    logging.info(f"Injected {header_name} auth header for {policy.hostname}")
 
     return headers
 
 
+def inject_authentication_for_url(url: str, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Same as inject_authentication(), but takes a full URL"""
+    return inject_authentication(_policy_for_url(url), headers)
+
+
 # ============================================================================
 # PATTERN 2: Custom Timeouts by Domain
 # ============================================================================
@@ -104,41 +200,50 @@ DOMAIN_TIMEOUT_CONFIG = {
 }
 
 
-def get_timeout_for_domain(url: str, default_timeout: float) -> float:
+def get_timeout_for_domain(policy: Optional[DomainPolicy], default_timeout: float) -> float:
     """
     Get custom timeout based on domain.
 
     Usage:
         In make_http_request(), when creating AsyncClient:
-        timeout = get_timeout_for_domain(request.url, request.timeout)
+        timeout = get_timeout_for_domain(policy, request.timeout)
     """
-    parsed = urlparse(url)
-    hostname = parsed.hostname
+    if policy is None or policy.timeout is None:
+        return default_timeout
+
+    return policy.timeout
 
-    return DOMAIN_TIMEOUT_CONFIG.get(hostname, default_timeout)
+
+def get_timeout_for_url(url: str, default_timeout: float) -> float:
+    """Same as get_timeout_for_domain(), but takes a full URL"""
+    return get_timeout_for_domain(_policy_for_url(url), default_timeout)
 
 
 # ============================================================================
 # PATTERN 3: Response Sanitization
 # ============================================================================
 
-SENSITIVE_HEADERS = [
+# Lowercase header names, stored as a frozenset for O(1) membership checks
+SENSITIVE_HEADERS = frozenset([
     "set-cookie",
     "cookie",
     "authorization",
     "x-api-key",
     "x-auth-token",
     "x-csrf-token",
-]
+])
 
 
-def sanitize_response_headers(headers: Dict[str, str]) -> Dict[str, str]:
+def sanitize_response_headers(headers: Mapping[str, str]) -> Dict[str, str]:
     """
     Remove or redact sensitive headers from responses.
 
+    Accepts any mapping, including httpx.Headers, so response headers can be
+    passed in directly without converting them to a dict first.
+
     Usage:
         In make_http_request(), before returning:
-        sanitized_headers = sanitize_response_headers(format_headers(response.headers))
+        sanitized_headers = sanitize_response_headers(response.headers)
     """
     sanitized = {}
     for key, value in headers.items():
@@ -149,10 +254,18 @@ def sanitize_response_headers(headers: Dict[str, str]) -> Dict[str, str]:
     return sanitized
 
 
-def sanitize_response_body(body: any, content_type: str) -> any:
+# Keys that might contain sensitive data in JSON bodies
+SENSITIVE_KEYS_SET = frozenset(["password", "secret", "token", "api_key", "private_key", "ssn"])
+
+
+def sanitize_response_body(body: Any, content_type: str) -> Any:
     """
     Remove sensitive data from response bodies.
 
+    The body is redacted in place (it is freshly parsed from the response, so
+    nothing else holds a reference to it) and nested dicts are walked with an
+    explicit stack rather than recursion.
+
     Usage:
         In make_http_request(), before returning body:
         body = sanitize_response_body(body, content_type)
@@ -160,23 +273,40 @@ def sanitize_response_body(body: any, content_type: str) -> any:
     if content_type != "json" or not isinstance(body, dict):
         return body
 
-    # List of keys that might contain sensitive data
-    sensitive_keys = ["password", "secret", "token", "api_key", "private_key", "ssn"]
-
-    def redact_dict(d: dict) -> dict:
-        result = {}
+    stack = [body]
+    while stack:
+        d = stack.pop()
         for key, value in d.items():
-            if key.lower() in sensitive_keys:
-                result[key] = "[REDACTED]"
+            if key.lower() in SENSITIVE_KEYS_SET:
+                d[key] = "[REDACTED]"
             elif isinstance(value, dict):
-                result[key] = redact_dict(value)
+                stack.append(value)
             elif isinstance(value, list):
-                result[key] = [redact_dict(item) if isinstance(item, dict) else item for item in value]
-            else:
-                result[key] = value
-        return result
+                stack.extend(item for item in value if isinstance(item, dict))
+
+    return body
+
+
+def _redact_object(d: dict) -> dict:
+    """json.loads() object_hook that redacts sensitive keys as each object is decoded"""
+    for key in d:
+        if key.lower() in SENSITIVE_KEYS_SET:
+            d[key] = "[REDACTED]"
+    return d
 
-    return redact_dict(body)
+
+def parse_json_redacted(content: bytes) -> Any:
+    """
+    Parse a JSON response body with sensitive keys already redacted.
+
+    Redaction happens inside the decoder as each object is built, so there is
+    no second walk over the parsed tree.
+
+    Usage:
+        In make_http_request(), instead of response.json() + sanitize_response_body():
+        body = parse_json_redacted(response.content)
+    """
+    return json.loads(content, object_hook=_redact_object)
 
 
 # ============================================================================
@@ -187,30 +317,33 @@ DOMAIN_SSL_CONFIG = {
     "dev.local": False,       # Self-signed cert
     "test.local": False,      # Self-signed cert
     "staging.hvs": False,     # Self-signed cert
+    "*.staging.hvs": False,   # Wildcard: any subdomain of staging.hvs
     "localhost": False,       # No SSL
     "127.0.0.1": False,       # No SSL
 }
 
 
-def should_verify_ssl(url: str, default_verify: bool) -> bool:
+def should_verify_ssl(policy: Optional[DomainPolicy], default_verify: bool) -> bool:
     """
     Determine if SSL should be verified for a domain.
 
     Usage:
         In make_http_request(), when creating AsyncClient:
-        verify_ssl = should_verify_ssl(request.url, request.verify_ssl)
+        verify_ssl = should_verify_ssl(policy, request.verify_ssl)
     """
-    parsed = urlparse(url)
-    hostname = parsed.hostname
-
     # Check if there's a specific config for this domain
-    if hostname in DOMAIN_SSL_CONFIG:
-        return DOMAIN_SSL_CONFIG[hostname]
+    if policy is not None and policy.verify_ssl is not None:
+        return policy.verify_ssl
 
     # Default behavior
     return default_verify
 
 
+def should_verify_ssl_for_url(url: str, default_verify: bool) -> bool:
+    """Same as should_verify_ssl(), but takes a full URL"""
+    return should_verify_ssl(_policy_for_url(url), default_verify)
+
+
 # ============================================================================
 # PATTERN 5: Request/Response Logging
 # ============================================================================
@@ -225,7 +358,13 @@ http_logger.setLevel(logging.INFO)
 # http_logger.addHandler(handler)
 
 
-def log_request(method: str, url: str, headers: Optional[Dict[str, str]], body: Optional[str]):
+def log_request(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]],
+    body: Optional[str],
+    _dumps: Callable[[Any], str] = json.dumps,
+) -> None:
     """
     Log outgoing HTTP requests.
 
@@ -233,33 +372,55 @@ def log_request(method: str, url: str, headers: Optional[Dict[str, str]], body:
         In make_http_request(), before making the request:
         log_request(request.method, request.url, request.headers, request.body)
     """
-    log_entry = {
-        "type": "request",
-        "method": method,
-        "url": url,
-        "headers": sanitize_response_headers(headers or {}),
-        "body_size": len(body) if body else 0,
-    }
-    http_logger.info(json.dumps(log_entry))
+    if not http_logger.isEnabledFor(logging.INFO):
+        return
 
+    # Requests often carry no headers at all, so skip sanitizing and encoding them
+    headers_json = _dumps(sanitize_response_headers(headers)) if headers else "{}"
 
-def log_response(url: str, status_code: int, headers: Dict[str, str], body_size: int, elapsed_ms: float):
+    # The log line has a fixed shape, so format it directly instead of building
+    # a dict and serializing the whole thing
+    http_logger.info(
+        f'{{"type": "request", "method": {_dumps(method)}, "url": {_dumps(url)}, '
+        f'"headers": {headers_json}, "body_size": {len(body) if body else 0}}}'
+    )
+
+
+def log_response(
+    url: str,
+    status_code: int,
+    *,
+    sanitized_headers: Dict[str, str],
+    body_size: int,
+    elapsed_ms: float,
+    _dumps: Callable[[Any], str] = json.dumps,
+) -> None:
     """
     Log HTTP responses.
 
+    Takes headers already passed through sanitize_response_headers(), so the
+    same sanitized dict can be reused for the result. They are keyword-only so
+    an older call passing raw response.headers positionally raises TypeError
+    instead of logging Authorization or X-API-Key values.
+
     Usage:
         In make_http_request(), after receiving response:
-        log_response(response.url, response.status_code, response.headers, len(response.content), elapsed)
+        log_response(
+            final_url,
+            response.status_code,
+            sanitized_headers=sanitized_headers,
+            body_size=len(response.content),
+            elapsed_ms=elapsed_ms,
+        )
     """
-    log_entry = {
-        "type": "response",
-        "url": url,
-        "status_code": status_code,
-        "headers": sanitize_response_headers(headers),
-        "body_size": body_size,
-        "elapsed_ms": elapsed_ms,
-    }
-    http_logger.info(json.dumps(log_entry))
+    if not http_logger.isEnabledFor(logging.INFO):
+        return
+
+    http_logger.info(
+        f'{{"type": "response", "url": {_dumps(url)}, "status_code": {status_code}, '
+        f'"headers": {_dumps(sanitized_headers)}, '
+        f'"body_size": {body_size}, "elapsed_ms": {elapsed_ms!r}}}'
+    )
 
 
 # ============================================================================
@@ -277,35 +438,72 @@ DOMAIN_CUSTOM_HEADERS = {
 }
 
 
-def inject_custom_headers(url: str, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+def inject_custom_headers(
+    policy: Optional[DomainPolicy], headers: Optional[Dict[str, str]]
+) -> Dict[str, str]:
     """
     Inject custom headers based on domain.
 
     Usage:
         In make_http_request(), before calling httpx:
-        headers = inject_custom_headers(request.url, request.headers)
+        headers = inject_custom_headers(policy, request.headers)
     """
     headers = headers or {}
-    parsed = urlparse(url)
-    hostname = parsed.hostname
 
-    if hostname in DOMAIN_CUSTOM_HEADERS:
-        custom_headers = DOMAIN_CUSTOM_HEADERS[hostname]
-        headers.update(custom_headers)
-        logging.info(f"Injected custom headers for {hostname}: {list(custom_headers.keys())}")
+    if policy is None or policy.custom_headers is None:
+        return headers
+
+    custom_headers = policy.custom_headers
+    headers.update(custom_headers)
+    logging.info(f"Injected custom headers for {policy.hostname}: {list(custom_headers.keys())}")
 
     return headers
 
 
+def inject_custom_headers_for_url(url: str, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Same as inject_custom_headers(), but takes a full URL"""
+    return inject_custom_headers(_policy_for_url(url), headers)
+
+
 # ============================================================================
 # PATTERN 7: Rate Limiting by Domain
 # ============================================================================
 
-from collections import defaultdict
-from datetime import datetime, timedelta
+# Token bucket per domain: [tokens_left, time.monotonic() of last refill,
+# time.monotonic() when it will be full again]. Tokens refill continuously at
+# max_requests per window, so each check is O(1) no matter how many requests
+# are in the window. Buckets are keyed by the request hostname, so a "*." limit
+# applies to each subdomain separately.
+rate_limit_buckets: Dict[str, list] = {}
+
+# Min-heap of (time the bucket is full again, hostname), one entry per bucket.
+# A full bucket behaves exactly like a missing one, so idle buckets for every
+# domain are dropped together from the front of the heap instead of piling up.
+_bucket_expiry_heap: list[tuple[float, str]] = []
+
+
+def _drop_idle_buckets(now: float) -> None:
+    """Remove every rate-limit bucket that has refilled completely by now"""
+    while _bucket_expiry_heap and _bucket_expiry_heap[0][0] <= now:
+        _, hostname = heapq.heappop(_bucket_expiry_heap)
+        bucket = rate_limit_buckets.get(hostname)
+        if bucket is None:
+            # Stale entry - the bucket was removed some other way
+            continue
+
+        full_at = bucket[2]
+        if full_at <= now:
+            del rate_limit_buckets[hostname]
+        else:
+            # Used again since this entry was pushed - check back when it's full
+            heapq.heappush(_bucket_expiry_heap, (full_at, hostname))
+
+
+def reset_rate_limits() -> None:
+    """Forget all rate-limit state, e.g. between tests or after changing limits"""
+    rate_limit_buckets.clear()
+    _bucket_expiry_heap.clear()
 
-# Track request counts per domain
-request_counts: Dict[str, list] = defaultdict(list)
 
 DOMAIN_RATE_LIMITS = {
     "api.hvs": {
@@ -319,7 +517,7 @@ DOMAIN_RATE_LIMITS = {
 }
 
 
-def check_rate_limit(url: str) -> tuple[bool, Optional[str]]:
+def check_rate_limit(policy: Optional[DomainPolicy]) -> tuple[bool, Optional[str]]:
     """
     Check if a request would exceed the rate limit for a domain.
 
@@ -328,42 +526,87 @@ def check_rate_limit(url: str) -> tuple[bool, Optional[str]]:
 
     Usage:
         In make_http_request(), before making the request:
-        allowed, error = check_rate_limit(request.url)
+        allowed, error = check_rate_limit(policy)
         if not allowed:
             return {"success": False, "error": error}
     """
-    parsed = urlparse(url)
-    hostname = parsed.hostname
-
-    if hostname not in DOMAIN_RATE_LIMITS:
+    if policy is None or policy.rate_limit is None:
         return True, None
 
-    config = DOMAIN_RATE_LIMITS[hostname]
+    hostname = policy.hostname
+    config = policy.rate_limit
     max_requests = config["requests"]
     window_seconds = config["window"]
 
-    # Clean up old requests
-    now = datetime.now()
-    cutoff = now - timedelta(seconds=window_seconds)
-    request_counts[hostname] = [
-        timestamp for timestamp in request_counts[hostname]
-        if timestamp > cutoff
-    ]
+    # Degenerate limits never refill a bucket, so answer them without one. As
+    # with the old sliding window, a zero-length window holds no requests.
+    if max_requests <= 0:
+        return False, f"Rate limit exceeded for {hostname}: {max_requests} requests per {window_seconds}s"
+    if window_seconds <= 0:
+        return True, None
+
+    now = time.monotonic()
+    _drop_idle_buckets(now)
+
+    # Refill tokens for the time elapsed since the last check
+    bucket = rate_limit_buckets.get(hostname)
+    is_new = False
+    if bucket is None:
+        bucket = rate_limit_buckets[hostname] = [float(max_requests), now, now]
+        is_new = True
+    tokens = min(max_requests, bucket[0] + (now - bucket[1]) * max_requests / window_seconds)
 
     # Check if we're at the limit
-    if len(request_counts[hostname]) >= max_requests:
-        return False, f"Rate limit exceeded for {hostname}: {max_requests} requests per {window_seconds}s"
+    allowed = tokens >= 1.0
+    if allowed:
+        # Spend a token on this request
+        tokens -= 1.0
+
+    bucket[0] = tokens
+    bucket[1] = now
+    bucket[2] = now + (max_requests - tokens) * window_seconds / max_requests
+    if is_new:
+        heapq.heappush(_bucket_expiry_heap, (bucket[2], hostname))
 
-    # Record this request
-    request_counts[hostname].append(now)
+    if not allowed:
+        return False, f"Rate limit exceeded for {hostname}: {max_requests} requests per {window_seconds}s"
     return True, None
 
 
+def check_rate_limit_for_url(url: str) -> tuple[bool, Optional[str]]:
+    """Same as check_rate_limit(), but takes a full URL"""
+    return check_rate_limit(_policy_for_url(url))
+
+
 # ============================================================================
 # PATTERN 8: Response Transformation
 # ============================================================================
 
-def transform_response_for_domain(url: str, body: any, content_type: str) -> any:
+def unwrap_data_envelope(body: Any, content_type: str) -> Any:
+    """Example: Extract only specific fields from API responses"""
+    if content_type == "json" and isinstance(body, dict):
+        # If there's a "data" wrapper, unwrap it
+        if "data" in body and "meta" in body:
+            return body["data"]
+    return body
+
+
+def flatten_nested(body: Any, content_type: str) -> Any:
+    """Example: Flatten nested structures"""
+    if content_type == "json":
+        # Custom transformation logic
+        pass
+    return body
+
+
+# Transformation function to apply to each domain's responses
+DOMAIN_TRANSFORMS = {
+    "api.hvs": unwrap_data_envelope,
+    "complex-api.hvs": flatten_nested,
+}
+
+
+def transform_response_for_domain(policy: Optional[DomainPolicy], body: Any, content_type: str) -> Any:
     """
     Transform response data based on domain-specific rules.
 
@@ -371,87 +614,111 @@ def transform_response_for_domain(url: str, body: any, content_type: str) -> any
 
     Usage:
         In make_http_request(), before returning body:
-        body = transform_response_for_domain(request.url, body, content_type)
+        body = transform_response_for_domain(policy, body, content_type)
     """
-    parsed = urlparse(url)
-    hostname = parsed.hostname
+    if policy is None or policy.transform is None:
+        return body
 
-    # Example: Extract only specific fields from API responses
-    if hostname == "api.hvs" and content_type == "json" and isinstance(body, dict):
-        # If there's a "data" wrapper, unwrap it
-        if "data" in body and "meta" in body:
-            return body["data"]
+    return policy.transform(body, content_type)
 
-    # Example: Flatten nested structures
-    if hostname == "complex-api.hvs" and content_type == "json":
-        # Custom transformation logic
-        pass
 
-    return body
+def transform_response_for_url(url: str, body: Any, content_type: str) -> Any:
+    """Same as transform_response_for_domain(), but takes a full URL"""
+    return transform_response_for_domain(_policy_for_url(url), body, content_type)
 
 
 # ============================================================================
 # PATTERN 9: Retry Logic
 # ============================================================================
 
-import asyncio
+# Methods that are safe to resend after the server has already responded. A
+# POST or PATCH that returned 500 may have partly taken effect, so it is never
+# replayed automatically.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+# Gateway-style failures that are usually worth retrying. Pass as
+# retry_statuses to opt in; by default responses are returned as they are.
+RETRYABLE_STATUSES = frozenset([502, 503, 504])
+
+
+@lru_cache(maxsize=None)
+def _backoff_delays(max_retries: int, backoff_factor: float) -> tuple[float, ...]:
+    """Delay before each retry: 1, backoff_factor, backoff_factor ** 2, ..."""
+    return tuple(backoff_factor ** attempt for attempt in range(max_retries))
 
 
 async def make_request_with_retry(
-    client,
+    client: httpx.AsyncClient,
     method: str,
     url: str,
     headers: Dict[str, str],
     content: Optional[bytes],
     max_retries: int = 3,
     backoff_factor: float = 2.0,
-):
+    timeout: Any = httpx.USE_CLIENT_DEFAULT,
+    retry_statuses: Collection[int] = frozenset(),
+) -> httpx.Response:
     """
-    Make HTTP request with exponential backoff retry.
+    Make HTTP request, optionally retrying error responses with exponential backoff.
+
+    Failed connections (for any method, since nothing was sent) are retried
+    immediately by the shared client's transport (see get_shared_client()), so
+    a request that succeeds first time costs nothing extra here. Note that:
+    - Read, write and pool timeouts are raised, not retried.
+    - A client not built by get_shared_client() gets no connection retries
+      unless its own transport has retries set.
+    - Responses are returned as they are unless their status is in
+      retry_statuses (e.g. RETRYABLE_STATUSES), and then only for
+      IDEMPOTENT_METHODS. With the defaults, a request that keeps failing
+      waits 1 + 2 + 4 = 7s before the last response is returned.
 
     Usage:
         Replace the client.request() call in make_http_request() with:
         response = await make_request_with_retry(
-            client, request.method, request.url, headers, content
+            client, request.method, request.url, headers, content, timeout=timeout
         )
     """
-    import httpx
-
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=headers,
-                content=content,
-            )
-            return response
-
-        except (httpx.TimeoutException, httpx.ConnectError) as e:
-            if attempt == max_retries:
-                # Last attempt failed, re-raise
-                raise
+    response = await client.request(
+        method=method,
+        url=url,
+        headers=headers,
+        content=content,
+        timeout=timeout,
+    )
+
+    if not retry_statuses or method.upper() not in IDEMPOTENT_METHODS:
+        return response
+
+    for attempt, delay in enumerate(_backoff_delays(max_retries, backoff_factor), start=1):
+        if response.status_code not in retry_statuses:
+            break
+
+        logging.warning(f"Request returned {response.status_code} (attempt {attempt}/{max_retries + 1})")
+        logging.info(f"Retrying in {delay}s...")
+        await asyncio.sleep(delay)
+        response = await client.request(
+            method=method,
+            url=url,
+            headers=headers,
+            content=content,
+            timeout=timeout,
+        )
 
-            # Calculate backoff delay
-            delay = backoff_factor ** attempt
-            logging.warning(f"Request failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
-            logging.info(f"Retrying in {delay}s...")
-            await asyncio.sleep(delay)
+    return response
 
 
 # ============================================================================
 # PATTERN 10: Caching
 # ============================================================================
 
-from datetime import datetime, timedelta
-from typing import Any
-
-# Simple in-memory cache
-cache: Dict[str, tuple[Any, datetime]] = {}
+# In-memory LRU cache of (response, time.monotonic() when stored), least
+# recently used first. Bounded so a long-running server doesn't grow forever.
+MAX_CACHE_ENTRIES = 10_000
+cache: "OrderedDict[str, tuple[Any, float]]" = OrderedDict()
 
 CACHE_TTL = {
-    "api.hvs": 60,        # Cache for 60 seconds
-    "static.hvs": 3600,   # Cache for 1 hour
+    "api.hvs": 60.0,        # Cache for 60 seconds
+    "static.hvs": 3600.0,   # Cache for 1 hour
 }
 
 
@@ -460,13 +727,15 @@ def get_cache_key(method: str, url: str) -> str:
     return f"{method}:{url}"
 
 
-def get_cached_response(method: str, url: str) -> Optional[Dict[str, Any]]:
+def get_cached_response(
+    method: str, url: str, policy: Optional[DomainPolicy]
+) -> Optional[Dict[str, Any]]:
     """
     Get cached response if available and not expired.
 
     Usage:
         In make_http_request(), before making the request:
-        cached = get_cached_response(request.method, request.url)
+        cached = get_cached_response(request.method, request.url, policy)
         if cached:
             return cached
     """
@@ -474,42 +743,233 @@ def get_cached_response(method: str, url: str) -> Optional[Dict[str, Any]]:
     if method.upper() != "GET":
         return None
 
-    parsed = urlparse(url)
-    hostname = parsed.hostname
-
-    if hostname not in CACHE_TTL:
+    if policy is None or policy.cache_ttl is None:
         return None
 
     cache_key = get_cache_key(method, url)
     if cache_key in cache:
         response, timestamp = cache[cache_key]
-        ttl = CACHE_TTL[hostname]
-        if datetime.now() - timestamp < timedelta(seconds=ttl):
+        if time.monotonic() - timestamp < policy.cache_ttl:
+            cache.move_to_end(cache_key)
             logging.info(f"Cache hit for {url}")
             return response
 
+        # Expired - drop it rather than keeping it around until evicted
+        del cache[cache_key]
+
     return None
 
 
-def cache_response(method: str, url: str, response: Dict[str, Any]):
+def get_cached_response_for_url(method: str, url: str) -> Optional[Dict[str, Any]]:
+    """Same as get_cached_response(), but looks the policy up from url"""
+    return get_cached_response(method, url, _policy_for_url(url))
+
+
+def cache_response(
+    method: str, url: str, response: Dict[str, Any], policy: Optional[DomainPolicy]
+) -> None:
     """
     Cache a successful response.
 
     Usage:
         In make_http_request(), after successful response:
-        cache_response(request.method, request.url, result)
+        cache_response(request.method, request.url, result, policy)
     """
     # Only cache successful GET requests
     if method.upper() != "GET" or not response.get("success"):
         return
 
-    parsed = urlparse(url)
-    hostname = parsed.hostname
-
-    if hostname in CACHE_TTL:
+    if policy is not None and policy.cache_ttl is not None:
         cache_key = get_cache_key(method, url)
-        cache[cache_key] = (response, datetime.now())
-        logging.info(f"Cached response for {url} (TTL: {CACHE_TTL[hostname]}s)")
+        cache[cache_key] = (response, time.monotonic())
+        cache.move_to_end(cache_key)
+        while len(cache) > MAX_CACHE_ENTRIES:
+            cache.popitem(last=False)
+        logging.info(f"Cached response for {url} (TTL: {policy.cache_ttl}s)")
+
+
+def cache_response_for_url(method: str, url: str, response: Dict[str, Any]) -> None:
+    """Same as cache_response(), but looks the policy up from url"""
+    cache_response(method, url, response, _policy_for_url(url))
+
+
+# ============================================================================
+# PATTERN 11: Shared HTTP Clients
+# ============================================================================
+
+# Idle keep-alive connections each shared client holds open
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Times the transport retries a failed connection before raising
+CONNECT_RETRIES = 3
+
+# One long-lived client per verify_ssl setting. Creating a client per request
+# throws away its connection pool, so every request pays for DNS, TCP and TLS
+# setup again. Timeouts are caller-supplied, so they are passed per request
+# rather than keyed on, which would create a new pool for every distinct value.
+_CLIENTS: Dict[bool, httpx.AsyncClient] = {}
+
+
+def get_shared_client(verify_ssl: bool) -> httpx.AsyncClient:
+    """
+    Get the pooled AsyncClient for this SSL setting, creating it on first use.
+
+    Pass the request's timeout to each client.request() call.
+
+    Usage:
+        In make_http_request(), instead of `async with httpx.AsyncClient(...) as client:`
+        client = get_shared_client(verify_ssl)
+    """
+    client = _CLIENTS.get(verify_ssl)
+    if client is None or client.is_closed:
+        # verify and limits belong to the transport once a custom one is given.
+        # A custom transport also stops httpx reading HTTP_PROXY, HTTPS_PROXY
+        # and NO_PROXY from the environment, unlike the plain AsyncClient in
+        # local_http_bridge_mcp.py. If you rely on them, pass proxy=... here.
+        transport = httpx.AsyncHTTPTransport(
+            verify=verify_ssl,
+            limits=httpx.Limits(max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+            retries=CONNECT_RETRIES,
+        )
+        # A shared client must not keep cookies: a Set-Cookie from one response
+        # would be sent on every later request to that domain, from any caller,
+        # and the bridge redacts Set-Cookie so callers couldn't see it happen.
+        # A jar whose policy allows no domains never stores or sends any. Pass
+        # the CookieJar itself: httpx copies a Cookies object into a default jar.
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        client = _CLIENTS[verify_ssl] = httpx.AsyncClient(transport=transport, cookies=no_cookies)
+    return client
+
+
+async def close_shared_clients() -> None:
+    """
+    Close every pooled client.
+
+    Usage:
+        In main(), once server.run() returns (e.g. in a finally block):
+        await close_shared_clients()
+    """
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
+
+
+# ============================================================================
+# COMBINED DOMAIN POLICY TABLE
+# ============================================================================
+
+def build_domain_policies() -> Dict[str, DomainPolicy]:
+    """
+    Merge the DOMAIN_* tables above into one DomainPolicy per config key.
+
+    One lookup in the result replaces a lookup in every table, and a hostname
+    with no config at all misses once and skips every helper.
+    """
+    hostnames = set().union(
+        DOMAIN_AUTH_CONFIG,
+        DOMAIN_TIMEOUT_CONFIG,
+        DOMAIN_SSL_CONFIG,
+        DOMAIN_CUSTOM_HEADERS,
+        DOMAIN_RATE_LIMITS,
+        DOMAIN_TRANSFORMS,
+        CACHE_TTL,
+    )
+
+    policies = {}
+    for hostname in hostnames:
+        auth_config = DOMAIN_AUTH_CONFIG.get(hostname)
+        policies[hostname] = DomainPolicy(
+            hostname,
+            auth_header=_build_auth_header(auth_config) if auth_config else None,
+            timeout=DOMAIN_TIMEOUT_CONFIG.get(hostname),
+            verify_ssl=DOMAIN_SSL_CONFIG.get(hostname),
+            custom_headers=DOMAIN_CUSTOM_HEADERS.get(hostname),
+            rate_limit=DOMAIN_RATE_LIMITS.get(hostname),
+            cache_ttl=CACHE_TTL.get(hostname),
+            transform=DOMAIN_TRANSFORMS.get(hostname),
+        )
+    return policies
+
+
+class _PolicyTrieNode:
+    """One hostname label in the reversed-label policy trie"""
+
+    __slots__ = ("children", "exact", "wildcard")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_PolicyTrieNode"] = {}
+        # Policy for the hostname ending at this node, and for "*." + that hostname
+        self.exact: Optional[DomainPolicy] = None
+        self.wildcard: Optional[DomainPolicy] = None
+
+
+def build_policy_trie(policies: Dict[str, DomainPolicy]) -> _PolicyTrieNode:
+    """
+    Index policies by reversed hostname labels ("api.hvs" -> "hvs", "api").
+
+    Matching a hostname then takes one step per label, however many domains
+    are configured.
+    """
+    root = _PolicyTrieNode()
+    for key, policy in policies.items():
+        labels = key.lower().split(".")
+        wildcard = labels[0] == "*"
+        if wildcard:
+            labels = labels[1:]
+
+        node = root
+        for label in reversed(labels):
+            node = node.children.setdefault(label, _PolicyTrieNode())
+
+        if wildcard:
+            node.wildcard = policy
+        else:
+            node.exact = policy
+    return root
+
+
+def _match_policy(hostname: str) -> Optional[DomainPolicy]:
+    """Walk the policy trie for hostname and merge every matching policy"""
+    matches = []
+    node = _POLICY_TRIE
+    for label in reversed(hostname.lower().split(".")):
+        # A wildcard here covers hostname, which still has labels left
+        if node.wildcard is not None:
+            matches.append(node.wildcard)
+        child = node.children.get(label)
+        if child is None:
+            break
+        node = child
+    else:
+        if node.exact is not None:
+            matches.append(node.exact)
+
+    if not matches:
+        return None
+    if len(matches) == 1 and matches[0].hostname == hostname:
+        return matches[0]
+
+    # Most specific match is last, so its fields override the broader ones
+    merged = DomainPolicy(hostname)
+    for policy in matches:
+        for field in DomainPolicy._FIELDS:
+            value = getattr(policy, field)
+            if value is not None:
+                setattr(merged, field, value)
+    return merged
+
+
+DOMAIN_POLICY: Dict[str, DomainPolicy] = build_domain_policies()
+_POLICY_TRIE = build_policy_trie(DOMAIN_POLICY)
+
+
+def reload_domain_policies() -> None:
+    """Rebuild DOMAIN_POLICY after changing the config tables at runtime"""
+    global DOMAIN_POLICY, _POLICY_TRIE
+    DOMAIN_POLICY = build_domain_policies()
+    _POLICY_TRIE = build_policy_trie(DOMAIN_POLICY)
+    lookup_policy.cache_clear()
 
 
 # ============================================================================
@@ -520,85 +980,93 @@ def cache_response(method: str, url: str, response: Dict[str, Any]):
 
 """
 async def make_http_request(request: HTTPRequest) -> Dict[str, Any]:
+    # Look up the domain's policy once and pass it to every helper
+    policy = lookup_policy(_hostname(request.url))
+
     # 1. Check cache
-    cached = get_cached_response(request.method, request.url)
+    cached = get_cached_response(request.method, request.url, policy)
     if cached:
         return cached
 
     # 2. Check rate limit
-    allowed, error = check_rate_limit(request.url)
+    allowed, error = check_rate_limit(policy)
     if not allowed:
         return {"success": False, "error": error}
 
     # 3. Inject authentication
-    headers = inject_authentication(request.url, request.headers)
+    headers = inject_authentication(policy, request.headers)
 
     # 4. Inject custom headers
-    headers = inject_custom_headers(request.url, headers)
+    headers = inject_custom_headers(policy, headers)
 
     # 5. Get timeout
-    timeout = get_timeout_for_domain(request.url, request.timeout)
+    timeout = get_timeout_for_domain(policy, request.timeout)
 
     # 6. Determine SSL verification
-    verify_ssl = should_verify_ssl(request.url, request.verify_ssl)
+    verify_ssl = should_verify_ssl(policy, request.verify_ssl)
 
     # 7. Log request
     log_request(request.method, request.url, headers, request.body)
 
-    async with httpx.AsyncClient(verify=verify_ssl, timeout=timeout) as client:
-        try:
-            # 8. Make request with retry
-            response = await make_request_with_retry(
-                client,
-                request.method,
-                request.url,
-                headers,
-                request.body.encode('utf-8') if request.body else None,
-            )
-
-            # 9. Log response
-            log_response(
-                str(response.url),
-                response.status_code,
-                format_headers(response.headers),
-                len(response.content),
-                response.elapsed.total_seconds() * 1000
-            )
-
-            # 10. Sanitize headers
-            sanitized_headers = sanitize_response_headers(format_headers(response.headers))
-
-            # 11. Parse body
-            content_type = detect_content_type(response.content, response.headers)
-            if content_type == "json":
-                body = response.json()
-            else:
-                body = response.text
-
-            # 12. Sanitize body
-            body = sanitize_response_body(body, content_type)
-
-            # 13. Transform response
-            body = transform_response_for_domain(request.url, body, content_type)
-
-            result = {
-                "success": True,
-                "status_code": response.status_code,
-                "headers": sanitized_headers,
-                "body": body,
-                "content_type": content_type,
-                "url": str(response.url),
-                "elapsed_ms": response.elapsed.total_seconds() * 1000,
-            }
-
-            # 14. Cache the response
-            cache_response(request.method, request.url, result)
-
-            return result
-
-        except Exception as e:
-            # Handle errors as before
-            ...
+    # Reuse a pooled client so connections and TLS sessions survive between requests
+    client = get_shared_client(verify_ssl)
+    try:
+        # 8. Make request with retry
+        response = await make_request_with_retry(
+            client,
+            request.method,
+            request.url,
+            headers,
+            request.body.encode('utf-8') if request.body else None,
+            timeout=timeout,
+        )
+
+        elapsed_ms = response.elapsed.total_seconds() * 1000
+
+        # httpx rebuilds str(response.url) on every call, so convert it once.
+        # It is the URL after any redirects, which can differ from request.url.
+        final_url = str(response.url)
+
+        # 9. Sanitize headers once, for both the log line and the result
+        sanitized_headers = sanitize_response_headers(response.headers)
+
+        # 10. Log response
+        log_response(
+            final_url,
+            response.status_code,
+            sanitized_headers=sanitized_headers,
+            body_size=len(response.content),
+            elapsed_ms=elapsed_ms,
+        )
+
+        # 11-12. Parse body, redacting sensitive JSON keys while it is decoded
+        content_type = detect_content_type(response.content, response.headers)
+        if content_type == "json":
+            body = parse_json_redacted(response.content)
+        else:
+            body = response.text
+
+        # 13. Transform response
+        body = transform_response_for_domain(policy, body, content_type)
+
+        result = {
+            "success": True,
+            "status_code": response.status_code,
+            "headers": sanitized_headers,
+            "body": body,
+            "content_type": content_type,
+            "url": final_url,
+            "elapsed_ms": elapsed_ms,
+        }
+
+        # 14. Cache the response
+        cache_response(request.method, request.url, result, policy)
+
+        return result
+
+    except Exception as e:
+        # Handle errors as before
+        ...
 """
 
 # ============================================================================
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Test suite for the patterns in advanced_config_example.py
+
+Run with: pytest test_advanced_config.py -v
+"""
+
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+import advanced_config_example
+from advanced_config_example import (
+    DOMAIN_RATE_LIMITS,
+    DOMAIN_SSL_CONFIG,
+    DOMAIN_TIMEOUT_CONFIG,
+    RETRYABLE_STATUSES,
+    cache_response,
+    cache_response_for_url,
+    check_rate_limit,
+    close_shared_clients,
+    get_cached_response,
+    get_cached_response_for_url,
+    get_shared_client,
+    log_response,
+    lookup_policy,
+    make_request_with_retry,
+    parse_json_redacted,
+    reload_domain_policies,
+    reset_rate_limits,
+    sanitize_response_body,
+)
+
+
+class TestPolicyMatching:
+    """Test exact and wildcard domain policy lookup"""
+
+    @pytest.fixture(autouse=True)
+    def config(self):
+        """Add test domains to the config tables and rebuild the policy table"""
+        with patch.dict(
+            DOMAIN_TIMEOUT_CONFIG,
+            {"exact.test": 1.0, "*.wild.test": 2.0, "*.merge.test": 5.0, "api.merge.test": 9.0},
+        ), patch.dict(DOMAIN_SSL_CONFIG, {"*.merge.test": False}):
+            reload_domain_policies()
+            yield
+        reload_domain_policies()
+
+    def test_exact_match(self):
+        """Test that plain keys match only that hostname"""
+        assert lookup_policy("exact.test").timeout == 1.0
+        assert lookup_policy("sub.exact.test") is None
+
+    def test_wildcard_matches_subdomains(self):
+        """Test that *. keys match subdomains at any depth"""
+        assert lookup_policy("a.wild.test").timeout == 2.0
+        assert lookup_policy("a.b.wild.test").timeout == 2.0
+
+    def test_wildcard_does_not_match_bare_domain(self):
+        """Test that *.wild.test does not match wild.test itself"""
+        assert lookup_policy("wild.test") is None
+
+    def test_unconfigured_hostname(self):
+        """Test that unknown and missing hostnames have no policy"""
+        assert lookup_policy("unknown.test") is None
+        assert lookup_policy(None) is None
+
+    def test_per_field_merge(self):
+        """Test that the most specific key wins per field and broader fields are kept"""
+        policy = lookup_policy("api.merge.test")
+        assert policy.hostname == "api.merge.test"
+        assert policy.timeout == 9.0
+        assert policy.verify_ssl is False
+
+        other = lookup_policy("other.merge.test")
+        assert other.timeout == 5.0
+        assert other.verify_ssl is False
+
+    def test_merge_does_not_modify_stored_policies(self):
+        """Test that merging builds a new policy instead of mutating the wildcard one"""
+        lookup_policy("api.merge.test")
+        assert advanced_config_example.DOMAIN_POLICY["*.merge.test"].timeout == 5.0
+
+
+class TestResponseCache:
+    """Test the bounded LRU response cache"""
+
+    @pytest.fixture(autouse=True)
+    def clean_cache(self):
+        """Start and finish each test with an empty cache"""
+        advanced_config_example.cache.clear()
+        yield
+        advanced_config_example.cache.clear()
+
+    def test_evicts_least_recently_used(self):
+        """Test that entries beyond MAX_CACHE_ENTRIES evict the least recently used"""
+        with patch.object(advanced_config_example, "MAX_CACHE_ENTRIES", 2):
+            cache_response_for_url("GET", "https://static.hvs/a", {"success": True})
+            cache_response_for_url("GET", "https://static.hvs/b", {"success": True})
+            # Touch "a" so "b" becomes the least recently used
+            assert get_cached_response_for_url("GET", "https://static.hvs/a") is not None
+            cache_response_for_url("GET", "https://static.hvs/c", {"success": True})
+
+        assert len(advanced_config_example.cache) == 2
+        assert get_cached_response_for_url("GET", "https://static.hvs/a") is not None
+        assert get_cached_response_for_url("GET", "https://static.hvs/b") is None
+        assert get_cached_response_for_url("GET", "https://static.hvs/c") is not None
+
+    def test_expired_entry_dropped(self):
+        """Test that an expired entry is a miss and is removed"""
+        now = [1000.0]
+        with patch("advanced_config_example.time.monotonic", lambda: now[0]):
+            cache_response_for_url("GET", "https://api.hvs/x", {"success": True})
+            now[0] += 61
+            assert get_cached_response_for_url("GET", "https://api.hvs/x") is None
+        assert len(advanced_config_example.cache) == 0
+
+    def test_only_configured_get_requests_cached(self):
+        """Test that non-GET requests and unconfigured domains are not cached"""
+        cache_response_for_url("POST", "https://api.hvs/x", {"success": True})
+        cache_response_for_url("GET", "https://unknown.test/x", {"success": True})
+        assert len(advanced_config_example.cache) == 0
+
+    def test_unconfigured_policy_not_looked_up_again(self):
+        """Test that a None policy means no config rather than a second lookup"""
+        with patch("advanced_config_example._policy_for_url") as policy_for_url:
+            assert get_cached_response("GET", "https://api.hvs/x", None) is None
+            cache_response("GET", "https://api.hvs/x", {"success": True}, None)
+        policy_for_url.assert_not_called()
+        assert len(advanced_config_example.cache) == 0
+
+
+class TestJSONRedaction:
+    """Test sensitive key redaction in JSON bodies"""
+
+    @pytest.mark.parametrize("encoding", ["utf-8", "utf-16", "utf-32"])
+    def test_redacts_any_json_encoding(self, encoding):
+        """Test that UTF-16/32 bodies are redacted, not just UTF-8"""
+        raw = '{"password": "s3cret", "name": "ok"}'.encode(encoding)
+        expected = {"password": "[REDACTED]", "name": "ok"}
+        assert parse_json_redacted(raw) == expected
+        assert sanitize_response_body(json.loads(raw), "json") == expected
+
+    def test_redacts_non_ascii_case_variant(self):
+        """Test that keys whose .lower() is sensitive are redacted (Kelvin sign in TOKEN)"""
+        key = "TO\u212aEN"
+        raw = json.dumps({key: "abc"}, ensure_ascii=False).encode("utf-8")
+        assert key.lower() == "token"
+        assert parse_json_redacted(raw) == {key: "[REDACTED]"}
+        assert sanitize_response_body(json.loads(raw), "json") == {key: "[REDACTED]"}
+
+    def test_redacts_uppercase_key(self):
+        """Test case-insensitive key matching"""
+        assert parse_json_redacted(b'{"TOKEN": 1}') == {"TOKEN": "[REDACTED]"}
+
+    def test_redacts_escaped_key(self):
+        """Test that keys written with \\u escapes are still redacted"""
+        raw = b'{"pass\\u0077ord": "x"}'
+        assert parse_json_redacted(raw) == {"password": "[REDACTED]"}
+        assert sanitize_response_body(json.loads(raw), "json") == {"password": "[REDACTED]"}
+
+    def test_redacts_nested_keys(self):
+        """Test redaction inside nested objects and lists"""
+        raw = b'{"user": {"api_key": "k", "items": [{"ssn": "1"}, 2]}}'
+        expected = {"user": {"api_key": "[REDACTED]", "items": [{"ssn": "[REDACTED]"}, 2]}}
+        assert parse_json_redacted(raw) == expected
+        assert sanitize_response_body(json.loads(raw), "json") == expected
+
+    def test_sensitive_value_is_not_redacted(self):
+        """Test that only keys are matched, not string values"""
+        raw = b'{"field": "password"}'
+        assert parse_json_redacted(raw) == {"field": "password"}
+        assert sanitize_response_body(json.loads(raw), "json") == {"field": "password"}
+
+    def test_non_json_body_unchanged(self):
+        """Test that non-JSON bodies pass through"""
+        assert sanitize_response_body("password: x", "text") == "password: x"
+
+
+class TestResponseLogging:
+    """Test the response log helper"""
+
+    def test_raw_headers_rejected_positionally(self):
+        """Test that an old-style positional call fails instead of logging raw headers"""
+        with pytest.raises(TypeError):
+            log_response("https://api.hvs/", 200, {"authorization": "Bearer x"}, 0, 1.0)
+
+
+class TestSharedClients:
+    """Test pooled AsyncClient reuse"""
+
+    @pytest.mark.asyncio
+    async def test_cookies_not_persisted(self):
+        """Test that a Set-Cookie from one response is not sent on the next request"""
+        sent_cookies = []
+
+        def handler(request):
+            sent_cookies.append(request.headers.get("cookie"))
+            return httpx.Response(200, headers={"set-cookie": "session=abc123; Path=/"})
+
+        with patch.object(
+            advanced_config_example.httpx,
+            "AsyncHTTPTransport",
+            lambda **kwargs: httpx.MockTransport(handler),
+        ):
+            client = get_shared_client(True)
+        try:
+            for _ in range(2):
+                await make_request_with_retry(client, "GET", "https://api.hvs/", {}, None)
+            assert sent_cookies == [None, None]
+            assert len(client.cookies) == 0
+        finally:
+            await close_shared_clients()
+
+    @pytest.mark.asyncio
+    async def test_one_client_per_ssl_setting(self):
+        """Test that clients are keyed only on verify_ssl, not on timeout"""
+        try:
+            assert get_shared_client(True) is get_shared_client(True)
+            assert get_shared_client(True) is not get_shared_client(False)
+            assert len(advanced_config_example._CLIENTS) == 2
+        finally:
+            await close_shared_clients()
+
+
+class TestRetry:
+    """Test opt-in retry of error responses"""
+
+    @staticmethod
+    def make_client(status_codes):
+        """Client whose responses have the given status codes, in order"""
+        remaining = list(status_codes)
+        return httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(remaining.pop(0)))
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_retried_on_5xx(self):
+        """Test that idempotent requests are retried until they succeed"""
+        async with self.make_client([503, 502, 200]) as client:
+            with patch("advanced_config_example.asyncio.sleep", new_callable=AsyncMock) as sleep:
+                response = await make_request_with_retry(
+                    client, "GET", "https://api.hvs/", {}, None, retry_statuses=RETRYABLE_STATUSES
+                )
+        assert response.status_code == 200
+        assert [call.args[0] for call in sleep.call_args_list] == [1.0, 2.0]
+
+    @pytest.mark.asyncio
+    async def test_retries_give_up(self):
+        """Test that the last 5xx response is returned once retries run out"""
+        async with self.make_client([503] * 4) as client:
+            with patch("advanced_config_example.asyncio.sleep", new_callable=AsyncMock) as sleep:
+                response = await make_request_with_retry(
+                    client, "PUT", "https://api.hvs/", {}, None, retry_statuses=RETRYABLE_STATUSES
+                )
+        assert response.status_code == 503
+        assert sleep.call_count == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("method", ["POST", "PATCH"])
+    async def test_non_idempotent_not_retried(self, method):
+        """Test that POST/PATCH are never replayed after a 5xx response"""
+        async with self.make_client([500, 200]) as client:
+            with patch("advanced_config_example.asyncio.sleep", new_callable=AsyncMock) as sleep:
+                response = await make_request_with_retry(
+                    client, method, "https://api.hvs/", {}, b"x", retry_statuses={500}
+                )
+        assert response.status_code == 500
+        sleep.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_error_responses_not_retried_by_default(self):
+        """Test that without retry_statuses a 5xx response is returned at once"""
+        async with self.make_client([503, 200]) as client:
+            with patch("advanced_config_example.asyncio.sleep", new_callable=AsyncMock) as sleep:
+                response = await make_request_with_retry(client, "GET", "https://api.hvs/", {}, None)
+        assert response.status_code == 503
+        sleep.assert_not_called()
+
+
+class TestRateLimit:
+    """Test token-bucket rate limiting"""
+
+    @pytest.fixture(autouse=True)
+    def clock(self):
+        """Reset rate-limit state and freeze time.monotonic() at a controllable value"""
+        reset_rate_limits()
+        now = [1000.0]
+        with patch("advanced_config_example.time.monotonic", lambda: now[0]):
+            yield now
+        reset_rate_limits()
+
+    def test_denies_when_bucket_empty(self, clock):
+        """Test that requests beyond the limit are denied"""
+        policy = lookup_policy("slow-api.hvs")  # 10 requests per 60s
+        for _ in range(10):
+            assert check_rate_limit(policy) == (True, None)
+
+        allowed, error = check_rate_limit(policy)
+        assert allowed is False
+        assert "Rate limit exceeded for slow-api.hvs" in error
+
+    def test_bucket_refills_over_time(self, clock):
+        """Test that tokens refill at max_requests per window"""
+        policy = lookup_policy("slow-api.hvs")
+        for _ in range(10):
+            check_rate_limit(policy)
+
+        # 6 seconds is one token's worth at 10 per 60s
+        clock[0] += 6
+        assert check_rate_limit(policy) == (True, None)
+        assert check_rate_limit(policy)[0] is False
+
+    def test_unlimited_domain(self, clock):
+        """Test that domains without a rate limit are always allowed"""
+        assert check_rate_limit(None) == (True, None)
+        assert check_rate_limit(lookup_policy("dev.local")) == (True, None)
+        assert advanced_config_example.rate_limit_buckets == {}
+
+    def test_idle_buckets_removed(self, clock):
+        """Test that fully refilled buckets are dropped on a later check"""
+        check_rate_limit(lookup_policy("api.hvs"))
+        assert "api.hvs" in advanced_config_example.rate_limit_buckets
+
+        # api.hvs is full again after one token's worth (0.6s at 100 per 60s)
+        clock[0] += 1
+        check_rate_limit(lookup_policy("slow-api.hvs"))
+        assert "api.hvs" not in advanced_config_example.rate_limit_buckets
+        assert "slow-api.hvs" in advanced_config_example.rate_limit_buckets
+        assert len(advanced_config_example._bucket_expiry_heap) == 1
+
+    def test_busy_bucket_kept(self, clock):
+        """Test that a bucket used again since its heap entry was pushed is kept"""
+        policy = lookup_policy("slow-api.hvs")
+        check_rate_limit(policy)
+        clock[0] += 5
+        check_rate_limit(policy)
+
+        # The first heap entry is due, but the bucket is still refilling
+        clock[0] += 2
+        check_rate_limit(lookup_policy("api.hvs"))
+        assert "slow-api.hvs" in advanced_config_example.rate_limit_buckets
+
+    def test_stale_heap_entry_after_external_reset(self, clock):
+        """Test that clearing the bucket dict directly doesn't break later checks"""
+        policy = lookup_policy("slow-api.hvs")
+        assert check_rate_limit(policy) == (True, None)
+
+        advanced_config_example.rate_limit_buckets.clear()
+        clock[0] += 3600
+        assert check_rate_limit(policy) == (True, None)
+
+    def test_zero_requests_always_denied(self, clock):
+        """Test that a limit of zero requests denies everything without a bucket"""
+        with patch.dict(DOMAIN_RATE_LIMITS, {"blocked.test": {"requests": 0, "window": 60}}):
+            reload_domain_policies()
+            try:
+                allowed, error = check_rate_limit(lookup_policy("blocked.test"))
+            finally:
+                reload_domain_policies()
+
+        assert allowed is False
+        assert "Rate limit exceeded for blocked.test" in error
+        assert advanced_config_example.rate_limit_buckets == {}
+        assert advanced_config_example._bucket_expiry_heap == []
+
+    def test_zero_window_always_allowed(self, clock):
+        """Test that a zero-length window never holds a request"""
+        with patch.dict(DOMAIN_RATE_LIMITS, {"nowindow.test": {"requests": 1, "window": 0}}):
+            reload_domain_policies()
+            try:
+                policy = lookup_policy("nowindow.test")
+                assert check_rate_limit(policy) == (True, None)
+                assert check_rate_limit(policy) == (True, None)
+            finally:
+                reload_domain_policies()
+
+        assert advanced_config_example.rate_limit_buckets == {}